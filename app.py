@@ -8,11 +8,17 @@ Run: streamlit run app.py
 
 import streamlit as st
 import requests
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
-from datetime import datetime, timedelta
-import plotly.express as px
+import numpy as np
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import plotly.graph_objects as go
 import re
-from typing import Tuple, Dict, Any
+import string
+from typing import Tuple, Dict, Any, Optional
 
 # ---------------------------
 # Configuration / Constants
@@ -22,28 +28,70 @@ TOP_10 = ["USD", "EUR", "JPY", "GBP", "AUD", "CAD", "CHF", "CNY", "SEK", "NZD"]
 DEFAULT_BASE = "USD"
 DEFAULT_TARGET = "EUR"
 MAX_HISTORY_DAYS = 365  # safety cap for timeseries requests
+HISTORY_FETCH_DAYS = 90  # longest "History range" option; 7/30-day views are slices of it
+
+# static page stylesheet, built once at import
+CSS = """
+<style>
+.header {
+    background: linear-gradient(90deg,#0f172a,#0b1220);
+    padding: 18px;
+    border-radius: 12px;
+    color: white;
+}
+.big-number {
+    font-size: 28px;
+    font-weight: 700;
+}
+.small-muted { color: #9aa4b2; }
+.card {
+    background: linear-gradient(180deg, rgba(255,255,255,0.02), rgba(255,255,255,0.00));
+    padding: 12px;
+    border-radius: 10px;
+    box-shadow: 0 6px 20px rgba(2,6,23,0.6);
+}
+</style>
+"""
+
+# natural-language parsing: compiled once at import instead of per keystroke
+_NL_RE = re.compile(r"([0-9]+(?:\.[0-9]+)?)\s*([A-Za-z]{3,})\s*(?:to|in)\s*([A-Za-z]{3,})", re.IGNORECASE)
+_KEEP_ALPHA = str.maketrans({c: None for c in map(chr, range(256)) if c not in string.ascii_uppercase})
+
+# shared HTTP session: pooled keep-alive connections + retry on transient errors
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+))
 
 # ---------------------------
 # Helper functions (modular)
 # ---------------------------
 
-@st.cache_data(ttl=60*15)  # cache for 15 minutes
-def fetch_symbols() -> Dict[str, Any]:
-    """Fetch supported currency symbols from exchangerate.host"""
-    res = requests.get(f"{API_BASE}/symbols", timeout=10)
+@st.cache_data(persist="disk", show_spinner=False)  # persisted caches never expire: clear via "Refresh symbols"
+def fetch_symbols() -> Tuple[Dict[str, Any], Tuple[str, ...], Tuple[str, ...], Dict[str, int]]:
+    """Fetch supported currency symbols, plus sorted codes, "CODE — Description" labels and a code -> index map"""
+    res = SESSION.get(f"{API_BASE}/symbols", timeout=10)
     res.raise_for_status()
-    data = res.json()
+    data = orjson.loads(res.content)
     # structure: { 'symbols': { 'USD': {description:'United States Dollar'}, ... } }
-    return data.get("symbols", {})
+    symbols = data.get("symbols", {})
+    if not symbols:
+        # raising keeps an error payload out of the (persistent) cache
+        raise ValueError("exchangerate.host returned no currency symbols")
+    codes = tuple(sorted(symbols))
+    labels = tuple(f"{c} — {symbols[c].get('description', '')}" for c in codes)
+    return symbols, codes, labels, {c: i for i, c in enumerate(codes)}
 
-@st.cache_data(ttl=60*5)
+@st.cache_data(ttl=60*5, max_entries=32, show_spinner=False)  # also called from worker threads (no script context)
 def fetch_latest(base: str = "USD") -> Dict[str, float]:
     """Fetch latest rates with given base currency"""
-    res = requests.get(f"{API_BASE}/latest", params={"base": base}, timeout=10)
+    res = SESSION.get(f"{API_BASE}/latest", params={"base": base}, timeout=10)
     res.raise_for_status()
-    return res.json().get("rates", {})
+    return orjson.loads(res.content).get("rates", {})
 
-@st.cache_data(ttl=60*60)
+@st.cache_data(ttl=60*60, max_entries=64, show_spinner=False)
 def fetch_timeseries(base: str, target: str, start_date: str, end_date: str) -> pd.DataFrame:
     """Fetch historical timeseries for a currency pair (start_date and end_date as YYYY-MM-DD)"""
     # safety: ensure not querying an excessive range
@@ -59,27 +107,38 @@ def fetch_timeseries(base: str, target: str, start_date: str, end_date: str) ->
         "base": base,
         "symbols": target
     }
-    res = requests.get(f"{API_BASE}/timeseries", params=params, timeout=15)
+    res = SESSION.get(f"{API_BASE}/timeseries", params=params, timeout=15)
     res.raise_for_status()
-    j = res.json()
+    j = orjson.loads(res.content)
     # j['rates'] is { 'YYYY-MM-DD': {'TARGET': value}, ... }
-    records = []
-    for d, rate_obj in sorted(j.get("rates", {}).items()):
-        records.append({"date": d, "rate": rate_obj.get(target)})
-    df = pd.DataFrame(records)
-    if not df.empty:
-        df["date"] = pd.to_datetime(df["date"])
-        df = df.set_index("date")
-    return df
+    rates = j.get("rates", {})
+    days = sorted(rates)
+    dates = np.array(days, dtype="datetime64[D]")
+    # missing values (None) become NaN under the float cast
+    vals = np.array([rates[d].get(target) for d in days], dtype=np.float64)
+    return pd.DataFrame({"rate": vals}, index=pd.DatetimeIndex(dates, name="date"))
+
+def get_rate(base: str, target: str) -> Optional[float]:
+    """Single base -> target rate from the cached latest rates (None if the target is missing)"""
+    return fetch_latest(base).get(target)
 
 def convert_currency(amount: float, base: str, target: str) -> Tuple[float, Dict[str, Any]]:
-    """Convert using the convert endpoint (single call)"""
+    """Convert locally from the cached latest rates; fall back to the convert endpoint"""
+    rate = get_rate(base, target)
+    if rate is not None:
+        meta = {"query": {"from": base, "to": target, "amount": amount}, "info": {"rate": rate}}
+        return amount * rate, meta
     params = {"from": base, "to": target, "amount": amount}
-    res = requests.get(f"{API_BASE}/convert", params=params, timeout=10)
+    res = SESSION.get(f"{API_BASE}/convert", params=params, timeout=10)
     res.raise_for_status()
-    j = res.json()
+    j = orjson.loads(res.content)
     return j.get("result"), j
 
+def history_window() -> Tuple[date, date]:
+    """(start, end) dates of the single timeseries window fetched for every history range"""
+    end = datetime.utcnow().date()
+    return end - timedelta(days=HISTORY_FETCH_DAYS), end
+
 def parse_nl_input(text: str) -> Tuple[float, str, str]:
     """
     Parse natural-language text like:
@@ -92,7 +151,7 @@ def parse_nl_input(text: str) -> Tuple[float, str, str]:
     # simple regex: number + currency + (to|in) + currency
     text = text.strip()
     # capture amount (float), then currency tokens (3-letter or words)
-    m = re.search(r"([0-9]+(?:\.[0-9]+)?)\s*([A-Za-z]{3,}|[A-Za-z]{3})\s*(?:to|in)\s*([A-Za-z]{3,})", text, re.IGNORECASE)
+    m = _NL_RE.search(text)
     if m:
         amt = float(m.group(1))
         a = m.group(2).upper()
@@ -107,7 +166,7 @@ def parse_nl_input(text: str) -> Tuple[float, str, str]:
             return amt, a, b
     raise ValueError("Could not parse natural language input. Try format: 'convert 500 USD to PKR'")
 
-# small mapping for common currency words -> 3-letter codes; extendable
+# small mapping for common currency words -> 3-letter codes; extendable (keys must be uppercase)
 COMMON_CURY = {
     "DOLLAR": "USD", "DOLLARS": "USD", "USD": "USD",
     "EURO": "EUR", "EUROS": "EUR", "EUR": "EUR",
@@ -120,59 +179,67 @@ COMMON_CURY = {
 }
 
 def word_to_currency_code(token: str) -> str:
-    tok = token.upper()
-    # strip trailing punctuation
-    tok = re.sub(r"[^A-Z]", "", tok)
-    if tok in COMMON_CURY:
-        return COMMON_CURY[tok]
-    if len(tok) == 3:  # already a code
-        return tok
-    return None
+    # strip trailing punctuation; fall back to the token itself if it is already a code
+    tok = token.upper().translate(_KEEP_ALPHA)
+    return COMMON_CURY.get(tok) or (tok if len(tok) == 3 else None)
 
 # ---------------------------
 # Visualization helpers
 # ---------------------------
 
-def plot_top10_rates(base: str, symbols: Dict[str, Any]):
-    """Bar chart comparing the base -> TOP_10 rates"""
+def _top10_frame(base: str, symbols: Dict[str, Any]) -> pd.DataFrame:
+    """Base -> TOP_10 rates as one DataFrame (columns: currency, rate, name), shared by the plotters"""
     rates = fetch_latest(base)
-    # build DataFrame for TOP_10 (if some missing, drop)
-    rows = []
-    for code in TOP_10:
-        v = rates.get(code)
-        if v is not None:
-            rows.append({"currency": code, "rate": v, "name": symbols.get(code, {}).get("description", "")})
-    if not rows:
+    # select TOP_10 (in order) in one step; missing or null rates are dropped
+    top = pd.Series(rates, dtype="float64").reindex(TOP_10).dropna()
+    return pd.DataFrame({
+        "currency": top.index,
+        "rate": top.values,
+        "name": [symbols.get(c, {}).get("description", "") for c in top.index],
+    })
+
+# Figure builders are cached as plain dicts (serializable); plotters wrap them back in go.Figure
+
+@st.cache_data(ttl=60*5, max_entries=32)
+def build_top10_fig(base: str, codes: Tuple[str, ...], rates: Tuple[float, ...], names: Tuple[str, ...]) -> Dict[str, Any]:
+    fig = go.Figure(go.Bar(x=codes, y=rates, hovertext=names))
+    fig.update_layout(title=f"Base {base} → Top currencies", xaxis_title="currency", yaxis_title="rate")
+    return fig.to_dict()
+
+@st.cache_data(ttl=60*5, max_entries=64)
+def build_timeseries_fig(base: str, target: str, start: str, end: str, _df: pd.DataFrame) -> Dict[str, Any]:
+    # _df is not hashed; the pair + date range is the cache key
+    fig = go.Figure(go.Scatter(x=_df.index, y=_df["rate"].values, mode="lines"))
+    fig.update_layout(title=f"{base} → {target} (historical)", xaxis_title="Date", yaxis_title=f"Rate ({target} per {base})")
+    return fig.to_dict()
+
+@st.cache_data(ttl=60*5, max_entries=32)
+def build_pie_fig(codes: Tuple[str, ...], rates: Tuple[float, ...]) -> Dict[str, Any]:
+    fig = go.Figure(go.Pie(labels=codes, values=rates))
+    fig.update_layout(title="Relative rates (visual comparison)")
+    return fig.to_dict()
+
+def plot_top10_rates(df: pd.DataFrame, base: str):
+    """Bar chart comparing the base -> TOP_10 rates (df from _top10_frame)"""
+    if df.empty:
         st.info("No rates available to plot for top currencies.")
         return
-    df = pd.DataFrame(rows)
-    fig = px.bar(df, x="currency", y="rate", hover_data=["name"], title=f"Base {base} → Top currencies")
-    st.plotly_chart(fig, use_container_width=True)
+    fig = build_top10_fig(base, tuple(df["currency"]), tuple(df["rate"]), tuple(df["name"]))
+    st.plotly_chart(go.Figure(fig), use_container_width=True)
 
-def plot_timeseries(df: pd.DataFrame, base: str, target: str):
-    """Line chart for the timeseries DF (index=date, column rate)"""
+def plot_timeseries(df: pd.DataFrame, base: str, target: str, start: str, end: str):
+    """Line chart for the timeseries DF (index=date, column rate) covering start..end (YYYY-MM-DD)"""
     if df.empty:
         st.info("No historical data to show.")
         return
-    df_plot = df.reset_index()
-    df_plot.columns = ["date", "rate"]
-    fig = px.line(df_plot, x="date", y="rate", title=f"{base} → {target} (historical)")
-    fig.update_layout(xaxis_title="Date", yaxis_title=f"Rate ({target} per {base})")
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(go.Figure(build_timeseries_fig(base, target, start, end, df)), use_container_width=True)
 
-def plot_pie_distribution(base: str, symbols: Dict[str, Any]):
+def plot_pie_distribution(df: pd.DataFrame, base: str):
     """Pie chart that shows relative value of top currencies vs base (for visual demo)"""
-    rates = fetch_latest(base)
-    rows = []
-    for code in TOP_10:
-        v = rates.get(code)
-        if v:
-            rows.append({"currency": code, "value": v})
-    if not rows:
+    if df.empty:
         return
-    df = pd.DataFrame(rows)
-    fig = px.pie(df, names="currency", values="value", title="Relative rates (visual comparison)")
-    st.plotly_chart(fig, use_container_width=True)
+    fig = build_pie_fig(tuple(df["currency"]), tuple(df["rate"]))
+    st.plotly_chart(go.Figure(fig), use_container_width=True)
 
 # ---------------------------
 # Streamlit UI layout
@@ -181,53 +248,52 @@ def plot_pie_distribution(base: str, symbols: Dict[str, Any]):
 st.set_page_config(page_title="Global Currency Converter & Analytics", layout="wide", initial_sidebar_state="expanded")
 
 # Top-level custom styling for a luxurious dark/light toggle (simple)
-st.markdown("""
-<style>
-.header {
-    background: linear-gradient(90deg,#0f172a,#0b1220);
-    padding: 18px;
-    border-radius: 12px;
-    color: white;
-}
-.big-number {
-    font-size: 28px;
-    font-weight: 700;
-}
-.small-muted { color: #9aa4b2; }
-.card {
-    background: linear-gradient(180deg, rgba(255,255,255,0.02), rgba(255,255,255,0.00));
-    padding: 12px;
-    border-radius: 10px;
-    box-shadow: 0 6px 20px rgba(2,6,23,0.6);
-}
-</style>
-""", unsafe_allow_html=True)
+# (re-emitted each run: Streamlit drops elements a rerun does not emit)
+st.markdown(CSS, unsafe_allow_html=True)
 
 # Header
 st.markdown('<div class="header"><h1 style="margin:0">💱 Global Currency Converter — Lux Dashboard</h1><div class="small-muted">Real-time conversions · Historical trends · Top currency analytics</div></div>', unsafe_allow_html=True)
 st.write("")  # spacing
 
+# cold start: warm the default pair's caches while the symbols load
+warm_ex = ThreadPoolExecutor(max_workers=3)
+symbols_future = warm_ex.submit(fetch_symbols)
+if "base_code" not in st.session_state:
+    warm_start, warm_end = history_window()
+    # results unused; failures are ignored (the analytics panel fetches again)
+    warm_ex.submit(fetch_latest, DEFAULT_BASE)
+    warm_ex.submit(fetch_timeseries, DEFAULT_BASE, DEFAULT_TARGET, warm_start.strftime("%Y-%m-%d"), warm_end.strftime("%Y-%m-%d"))
+warm_ex.shutdown(wait=False)  # only symbols_future is waited on (in the sidebar)
+
 # Sidebar controls
 with st.sidebar:
     st.header("Controls")
-    symbols = fetch_symbols()
-    currency_codes = sorted(symbols.keys())
-    # allow quick selection lists: show codes and description in dropdown labels
-    def label(code):
-        return f"{code} — {symbols.get(code, {}).get('description','')}"
-    base_sel = st.selectbox("Base currency", options=currency_codes, index=currency_codes.index(DEFAULT_BASE) if DEFAULT_BASE in currency_codes else 0, format_func=lambda x: label(x))
-    target_sel = st.selectbox("Target currency", options=currency_codes, index=currency_codes.index(DEFAULT_TARGET) if DEFAULT_TARGET in currency_codes else 1, format_func=lambda x: label(x))
+    # rendered first so a failed symbol load can still be retried from the page
+    if st.button("Refresh symbols"):
+        # drop the disk-persisted symbol list and re-fetch it
+        fetch_symbols.clear()
+        st.rerun()
+    try:
+        symbols, currency_codes, code_labels, code_idx = symbols_future.result()
+    except Exception as e:
+        st.error("Could not load currency symbols: " + str(e))
+        st.stop()
+    if not currency_codes:
+        st.error("No currency symbols available. Try \"Refresh symbols\".")
+        st.stop()
+    # selected pair lives in session_state as codes; fall back to defaults if a code disappears
+    for key, default, fallback_pos in (("base_code", DEFAULT_BASE, 0), ("target_code", DEFAULT_TARGET, 1)):
+        if st.session_state.get(key) not in code_idx:
+            st.session_state[key] = default if default in code_idx else currency_codes[min(fallback_pos, len(currency_codes) - 1)]
+    # allow quick selection lists: show prebuilt "CODE — Description" labels
+    st.selectbox("Base currency", options=currency_codes, key="base_code", format_func=lambda c: code_labels[code_idx[c]])
+    st.selectbox("Target currency", options=currency_codes, key="target_code", format_func=lambda c: code_labels[code_idx[c]])
     auto_refresh = st.checkbox("Auto-refresh rates every 5 minutes", value=False)
     refresh_btn = st.button("Refresh rates now")
     st.markdown("---")
     st.markdown("**Natural language input** (try: `convert 500 USD to PKR`)")
     nl_text = st.text_input("Or paste description here", value="")
     st.markdown("---")
-    st.markdown("Display options")
-    days_history = st.radio("History range for trend", options=["7 days", "30 days", "90 days"], index=1)
-    show_pie = st.checkbox("Show pie distribution", value=True)
-    show_top10 = st.checkbox("Show top-10 bar chart", value=True)
-    st.markdown("---")
     st.caption("Data provider: exchangerate.host (no API key required).")
 
 # main content columns
@@ -244,18 +310,22 @@ with col1:
             amt_nl, base_nl, target_nl = parse_nl_input(nl_text)
             parsed = (amt_nl, base_nl, target_nl)
             st.success(f"Parsed: {amt_nl} {base_nl} → {target_nl}")
-            # Offer to fill the inputs automatically
-            if st.button("Use parsed values"):
-                amount = amt_nl
-                base_sel = base_nl
-                target_sel = target_nl
+            # Offer to fill the inputs automatically (callback runs before the widgets are rebuilt)
+            def use_parsed(amt=amt_nl, b=base_nl, t=target_nl):
+                st.session_state.amount = amt
+                if b in code_idx:
+                    st.session_state.base_code = b
+                if t in code_idx:
+                    st.session_state.target_code = t
+            st.button("Use parsed values", on_click=use_parsed)
         except ValueError:
             st.warning("Could not parse the natural language input. Use format: 'convert 500 USD to PKR'")
 
-    # numeric input plus dropdowns (these reflect sidebar selections but are visible here too)
-    amount = st.number_input("Amount", min_value=0.0, value=100.0, step=1.0, format="%.2f")
-    base = st.selectbox("From (base)", currency_codes, index=currency_codes.index(base_sel), format_func=lambda x: label(x))
-    target = st.selectbox("To (target)", currency_codes, index=currency_codes.index(target_sel), format_func=lambda x: label(x))
+    # numeric input; the currency pair comes from the sidebar selections
+    st.session_state.setdefault("amount", 100.0)
+    amount = st.number_input("Amount", min_value=0.0, step=1.0, format="%.2f", key="amount")
+    base = st.session_state.base_code
+    target = st.session_state.target_code
     if st.button("Convert"):
         try:
             converted_val, meta = convert_currency(amount, base, target)
@@ -280,28 +350,36 @@ with col1:
     st.write("Target name:", symbols.get(target, {}).get("description", ""))
 
 # Right column: charts & analytics
-with col2:
-    st.subheader("Analytics & Visuals")
-    # manual refresh handling
-    if refresh_btn:
-        # clear caches by re-calling fetch functions with different args; streamlit cache_data TTL will handle
-        st.success("Refreshing cached rates...")
+@st.fragment
+def analytics_panel(base: str, target: str, symbols: Dict[str, Any]):
+    """Charts panel; its display options live inside the fragment so toggling them reruns only this panel"""
+    opt1, opt2, opt3 = st.columns([1.4, 1, 1])
+    days_history = opt1.radio("History range for trend", options=["7 days", "30 days", "90 days"], index=1, horizontal=True)
+    show_pie = opt2.checkbox("Show pie distribution", value=True)
+    show_top10 = opt3.checkbox("Show top-10 bar chart", value=True)
+
+    days = 7 if days_history == "7 days" else 30 if days_history == "30 days" else 90
+    # always fetch the widest window (one cached request); shorter ranges are sliced locally
+    window_start, end = history_window()
+    start = end - timedelta(days=days)
+    # fire the independent requests concurrently; render on the main thread afterwards
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        top10_future = ex.submit(_top10_frame, base, symbols)
+        ts_future = ex.submit(fetch_timeseries, base, target, window_start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
+
     # show top10 bar
     if show_top10:
         st.markdown("### Top currencies comparison")
         try:
-            plot_top10_rates(base, symbols)
+            plot_top10_rates(top10_future.result(), base)
         except Exception as e:
             st.error("Failed to load top-10 chart: " + str(e))
 
     # historical timeseries
     st.markdown("### Historical trend for selected pair")
-    days = 7 if days_history == "7 days" else 30 if days_history == "30 days" else 90
-    end = datetime.utcnow().date()
-    start = end - timedelta(days=days)
     try:
-        ts_df = fetch_timeseries(base, target, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
-        plot_timeseries(ts_df, base, target)
+        ts_df = ts_future.result().loc[pd.Timestamp(start):]
+        plot_timeseries(ts_df, base, target, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
     except Exception as e:
         st.error("Could not fetch historical data: " + str(e))
 
@@ -309,17 +387,25 @@ with col2:
     if show_pie:
         st.markdown("### Pie / distribution")
         try:
-            plot_pie_distribution(base, symbols)
+            plot_pie_distribution(top10_future.result(), base)
         except Exception as e:
             st.error("Pie chart failed: " + str(e))
 
+with col2:
+    st.subheader("Analytics & Visuals")
+    # manual refresh handling
+    if refresh_btn:
+        # clear caches by re-calling fetch functions with different args; streamlit cache_data TTL will handle
+        st.success("Refreshing cached rates...")
+    analytics_panel(base, target, symbols)
+
 # Footer: additional features
 st.markdown("---")
 st.markdown("### Extra features & tips")
 st.markdown("""
 - Natural language input: `convert 500 USD to PKR` tries to auto-detect amounts & currency codes.  
 - If a currency is missing, please search for its 3-letter ISO code (e.g., `USD`, `EUR`, `PKR`).  
-- Use the **sidebar** to change options like auto-refresh and history range.  
+- Use the **sidebar** to change options like auto-refresh; chart options (history range, charts shown) sit above the charts.  
 """)
 
 st.markdown("Made with ❤️ · Data: exchangerate.host (free, no API key).")